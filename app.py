@@ -1,22 +1,276 @@
-from flask import Flask, jsonify, request, render_template, send_file
+from flask import Flask, Response, jsonify, request, render_template, send_file
+from flask.json.provider import JSONProvider
+from a2wsgi import WSGIMiddleware
 from mooring_data_generator.builder import build_random_port
 from mooring_data_generator.models import PortData
 import json, random
+from collections import OrderedDict
 from datetime import datetime
+import functools
+import itertools
 import os
-import importlib
+import threading
+import types
 import mooring_data_generator.builder as builder_module
+import numpy as np
+import orjson
+
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider that serializes with orjson instead of the stdlib json module
+
+    Output is always compact with keys in insertion order, also in debug mode.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")
+
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
-# Store the port worker globally for updates
-port_worker = None
+# ASGI entrypoint for uvicorn; a2wsgi runs each request on a pool of worker threads
+asgi_app = WSGIMiddleware(app)
+
+# Generated ports by the id clients pass as ?id=, least recently used first
+_ports = OrderedDict()
+# Held for every lookup or change of _ports
+_ports_lock = threading.Lock()
+# Held while generating: the builder draws names from module level lists shared by all ports
+_builder_lock = threading.Lock()
+DEFAULT_PORT_ID = "default"
+# Once more ports than this are held, the least recently used one is dropped (never the default)
+MAX_PORTS = 32
+
+# Every snapshot of any port gets the next version, which also serves as its ETag
+_versions = itertools.count(1)
+# Prefixed to ETags so versions handed out before a restart never match
+_etag_prefix = os.urandom(4).hex()
+
+# The builder removes names from these lists as it uses them; keep the full lists to restore
+_NAME_POOLS = {
+    attr: list(getattr(builder_module, attr))
+    for attr in ("WA_PORT_NAMES", "NAUTICAL_SUPERLATIVES", "NAUTICAL_BASE_NAMES", "BOLLARD_NAMES", "SHIP_IDS")
+}
 
 
 def reset_generator_state():
     """Reset the mooring data generator to allow unlimited generations"""
-    # Reload the builder module to reset the used names lists
-    importlib.reload(builder_module)
+    # Refill the used names lists in place so the builder keeps its references to them
+    for attr, names in _NAME_POOLS.items():
+        getattr(builder_module, attr)[:] = names
+
+
+def build_hook_arrays(port_data):
+    """Flatten all hooks of the port into parallel arrays, one element per hook
+
+    ``bollard`` holds the index of each hook's bollard, counting across all berths.
+    Missing tensions are stored as 0 with ``has_tension`` set to False.
+    """
+    tensions, has_tension, faulted, attached, bollard_ids = [], [], [], [], []
+    bollard_index = 0
+    for berth in port_data.berths:
+        for bollard in berth.bollards:
+            for hook in bollard.hooks:
+                tension = hook.tension
+                tensions.append(tension or 0)
+                has_tension.append(tension is not None)
+                faulted.append(hook.faulted)
+                attached.append(bool(hook.attached_line))
+                bollard_ids.append(bollard_index)
+            bollard_index += 1
+    return {
+        "tension": np.array(tensions, dtype=np.int64),
+        "has_tension": np.array(has_tension, dtype=bool),
+        "faulted": np.array(faulted, dtype=bool),
+        "attached": np.array(attached, dtype=bool),
+        "bollard": np.array(bollard_ids, dtype=np.intp),
+        "bollard_count": bollard_index,
+    }
+
+
+class PortSnapshot:
+    """One version of a port's data, with everything the read endpoints derive from it
+
+    A snapshot is never changed once published, apart from filling its caches, so
+    requests can keep serving it while the port moves on to the next one.
+    """
+
+    def __init__(self, port_data, ship_payloads=None):
+        self.data = port_data
+        self.version = next(_versions)
+        self.etag = f"{_etag_prefix}-{self.version}"
+        # When the port was generated or updated, as an ISO 8601 string
+        self.last_update_iso = datetime.now().isoformat()
+        # The hooks as parallel NumPy arrays, see build_hook_arrays()
+        self.hook_arrays = build_hook_arrays(port_data)
+        # The berths by name
+        self.berth_index = {berth.name: berth for berth in port_data.berths}
+        # serialize_berth() results by berth name
+        self.berth_payloads = {}
+        # serialize_ship() results by berth name; ships stay put until a new port is generated
+        self.ship_payloads = {} if ship_payloads is None else ship_payloads
+        # Serialized bodies of the read endpoints, see cached_json()
+        self.responses = {}
+
+    def serialize_ship(self, berth):
+        """The berth's ship as a dict, built once per generated port"""
+        if not berth.ship:
+            return None
+        payload = self.ship_payloads.get(berth.name)
+        if payload is None:
+            payload = self.ship_payloads[berth.name] = {
+                "name": berth.ship.name,
+                "vessel_id": berth.ship.vessel_id
+            }
+        return payload
+
+    def serialize_berth(self, berth):
+        """Full berth details as returned by the berth endpoints, built once per snapshot"""
+        payload = self.berth_payloads.get(berth.name)
+        if payload is None:
+            # Built by hand rather than with berth.model_dump_json(): the API names
+            # distance_status just "status", and the dicts are reused across endpoints
+            # (the analysis endpoint shares the hook lists) rather than encoded once
+            payload = self.berth_payloads[berth.name] = {
+                "name": berth.name,
+                "bollard_count": berth.bollard_count,
+                "hook_count": berth.hook_count,
+                "ship": self.serialize_ship(berth),
+                "radars": [
+                    {
+                        "name": radar.name,
+                        "ship_distance": radar.ship_distance,
+                        "distance_change": radar.distance_change,
+                        "status": radar.distance_status
+                    }
+                    for radar in berth.radars
+                ],
+                "bollards": [
+                    {
+                        "name": bollard.name,
+                        "hooks": [
+                            {
+                                "name": hook.name,
+                                "tension": hook.tension,
+                                "faulted": hook.faulted,
+                                "attached_line": hook.attached_line
+                            }
+                            for hook in bollard.hooks
+                        ]
+                    }
+                    for bollard in berth.bollards
+                ]
+            }
+        return payload
+
+
+class PortState:
+    """A generated port worker and the snapshot of its data currently being served"""
+
+    def __init__(self, worker):
+        self.worker = worker
+        # Held while updating so two updates of this port never interleave
+        self.lock = threading.Lock()
+        self.snapshot = PortSnapshot(worker.data)
+
+    def update(self):
+        """Advance the port's readings and publish a fresh snapshot of them"""
+        with self.lock:
+            self.worker.update()
+            # Updates only move readings, so the ship dicts carry over
+            self.snapshot = PortSnapshot(self.worker.data, self.snapshot.ship_payloads)
+
+
+def requested_port_id():
+    """The port the request is about, from its optional ?id= query parameter"""
+    return request.args.get("id", DEFAULT_PORT_ID)
+
+
+def requested_port():
+    """The requested port, marked as most recently used, or None if it was never generated"""
+    port_id = requested_port_id()
+    with _ports_lock:
+        port = _ports.get(port_id)
+        if port is not None:
+            _ports.move_to_end(port_id)
+    return port
+
+
+def store_port(port_id, port):
+    """Register a newly generated port, evicting the least recently used ones over MAX_PORTS"""
+    with _ports_lock:
+        _ports[port_id] = port
+        _ports.move_to_end(port_id)
+        while len(_ports) > MAX_PORTS:
+            oldest = next(pid for pid in _ports if pid != DEFAULT_PORT_ID)
+            del _ports[oldest]
+
+
+def current_snapshot():
+    """The snapshot being served for the requested port, or None if it was never generated"""
+    port = requested_port()
+    return port.snapshot if port else None
+
+
+def json_response(body):
+    """Build a JSON response from a payload, or from already serialized bytes or byte chunks"""
+    if not isinstance(body, (bytes, types.GeneratorType)):
+        body = orjson.dumps(body)
+    return Response(body, mimetype="application/json")
+
+
+def cached_json(view):
+    """Serve a view's JSON body from the cache until the port data changes
+
+    The view is called with the requested port's current snapshot, or with None if
+    that port was never generated. Responses carry the snapshot version as their
+    ETag, so polling clients that already have it get an empty 304 Not Modified;
+    the view still runs first when needed, so missing resources keep their 404.
+    Dict results are cached, generators of bytes are streamed and cached once
+    complete; error responses are passed through untouched.
+    """
+    @functools.wraps(view)
+    def wrapper(**kwargs):
+        snapshot = current_snapshot()
+        if snapshot is None:
+            return view(None, **kwargs)
+        key = (view.__name__, *kwargs.values())
+        # Errors are never cached, so a cached body means the resource exists
+        body = snapshot.responses.get(key)
+        if body is None:
+            result = view(snapshot, **kwargs)
+            if isinstance(result, dict):
+                body = snapshot.responses[key] = orjson.dumps(result)
+            elif not isinstance(result, types.GeneratorType):
+                return result
+        if request.if_none_match.contains_weak(snapshot.etag):
+            response = Response(status=304)
+        elif body is not None:
+            response = json_response(body)
+        else:
+            response = json_response(cache_stream(snapshot.responses, key, result))
+        response.set_etag(snapshot.etag, weak=True)
+        # Let browsers keep the body but always revalidate it with If-None-Match
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+    return wrapper
+
+
+def cache_stream(responses, key, chunks):
+    """Pass a streamed body through, storing it in ``responses`` once it is complete"""
+    body = []
+    for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+    responses[key] = b"".join(body)
 
 
 def serialize_data(obj):
@@ -56,22 +310,22 @@ def api_docs():
 @app.route('/api/port', methods=['GET'])
 def get_port():
     """Generate and return random port data"""
-    global port_worker
+    port_id = requested_port_id()
     
     try:
-        # Reset generator state to prevent exhausting ship names
-        reset_generator_state()
-        
-        # Re-import build_random_port after reload
-        from mooring_data_generator.builder import build_random_port
-        port_worker = build_random_port()
+        with _builder_lock:
+            # Reset generator state to prevent exhausting ship names
+            reset_generator_state()
+            port = PortState(build_random_port())
+        store_port(port_id, port)
     except Exception as e:
         return jsonify({"error": f"Failed to generate port: {str(e)}"}), 500
     
     # Convert the port data to a serializable format
-    port_data = port_worker.data
+    snapshot = port.snapshot
+    port_data = snapshot.data
     
-    return jsonify({
+    return json_response({
         "port_name": port_data.name,
         "total_berths": len(port_data.berths),
         "berths": [
@@ -79,11 +333,8 @@ def get_port():
                 "name": berth.name,
                 "bollard_count": berth.bollard_count,
                 "hook_count": berth.hook_count,
-                "ship": {
-                    "name": berth.ship.name,
-                    "vessel_id": berth.ship.vessel_id
-                } if berth.ship else None,
-                "active_radars": len([r for r in berth.radars if r.distance_status == "ACTIVE"]),
+                "ship": snapshot.serialize_ship(berth),
+                "active_radars": sum(1 for r in berth.radars if r.distance_status == "ACTIVE"),
                 "total_radars": len(berth.radars)
             }
             for berth in port_data.berths
@@ -92,159 +343,90 @@ def get_port():
 
 
 @app.route('/api/port/berths', methods=['GET'])
-def get_berths():
+@cached_json
+def get_berths(snapshot):
     """Get all berths with detailed information"""
-    if not port_worker:
+    if not snapshot:
         return jsonify({"error": "No port data available. Call /api/port first"}), 404
     
-    port_data = port_worker.data
-    berths_data = []
+    port_data = snapshot.data
     
-    for berth in port_data.berths:
-        berth_info = {
-            "name": berth.name,
-            "bollard_count": berth.bollard_count,
-            "hook_count": berth.hook_count,
-            "ship": {
-                "name": berth.ship.name,
-                "vessel_id": berth.ship.vessel_id
-            } if berth.ship else None,
-            "radars": [
-                {
-                    "name": radar.name,
-                    "ship_distance": radar.ship_distance,
-                    "distance_change": radar.distance_change,
-                    "status": radar.distance_status
-                }
-                for radar in berth.radars
-            ],
-            "bollards": [
-                {
-                    "name": bollard.name,
-                    "hooks": [
-                        {
-                            "name": hook.name,
-                            "tension": hook.tension if hook.tension is not None else None,
-                            "faulted": hook.faulted,
-                            "attached_line": hook.attached_line
-                        }
-                        for hook in bollard.hooks
-                    ]
-                }
-                for bollard in berth.bollards
-            ]
-        }
-        berths_data.append(berth_info)
-    
-    return jsonify({
+    return {
         "port_name": port_data.name,
-        "berths": berths_data
-    })
+        "berths": [snapshot.serialize_berth(berth) for berth in port_data.berths]
+    }
 
 
 @app.route('/api/port/berth/<berth_name>', methods=['GET'])
-def get_berth(berth_name):
+@cached_json
+def get_berth(snapshot, berth_name):
     """Get specific berth details by name"""
-    if not port_worker:
+    if not snapshot:
         return jsonify({"error": "No port data available. Call /api/port first"}), 404
     
-    port_data = port_worker.data
-    
     # Find the berth
-    berth = next((b for b in port_data.berths if b.name == berth_name), None)
+    berth = snapshot.berth_index.get(berth_name)
     
     if not berth:
         return jsonify({"error": f"Berth '{berth_name}' not found"}), 404
     
-    return jsonify({
-        "name": berth.name,
-        "bollard_count": berth.bollard_count,
-        "hook_count": berth.hook_count,
-        "ship": {
-            "name": berth.ship.name,
-            "vessel_id": berth.ship.vessel_id
-        } if berth.ship else None,
-        "radars": [
-            {
-                "name": radar.name,
-                "ship_distance": radar.ship_distance,
-                "distance_change": radar.distance_change,
-                "status": radar.distance_status
-            }
-            for radar in berth.radars
-        ],
-        "bollards": [
-            {
-                "name": bollard.name,
-                "hooks": [
-                    {
-                        "name": hook.name,
-                        "tension": hook.tension if hook.tension is not None else None,
-                        "faulted": hook.faulted,
-                        "attached_line": hook.attached_line
-                    }
-                    for hook in bollard.hooks
-                ]
-            }
-            for bollard in berth.bollards
-        ]
-    })
+    return snapshot.serialize_berth(berth)
 
 
 @app.route('/api/port/update', methods=['POST'])
 def update_port():
     """Update port data - simulates real-time data changes"""
-    global port_worker
+    port = requested_port()
     
-    if not port_worker:
+    if not port:
         return jsonify({"error": "No port data available. Call /api/port first"}), 404
     
     # Update the port worker (this simulates new readings)
-    port_worker.update()
+    port.update()
     
-    return jsonify({
+    return json_response({
         "message": "Port data updated successfully",
-        "port_name": port_worker.data.name
+        "port_name": port.snapshot.data.name
     })
 
 
 @app.route('/api/port/raw', methods=['GET'])
-def get_raw_port():
+@cached_json
+def get_raw_port(snapshot):
     """Get raw port data as string representation"""
-    if not port_worker:
+    if not snapshot:
         return jsonify({"error": "No port data available. Call /api/port first"}), 404
     
-    return jsonify({
-        "raw_data": str(port_worker.data)
-    })
+    return {
+        "raw_data": str(snapshot.data)
+    }
 
 
 @app.route('/api/port/statistics', methods=['GET'])
-def get_statistics():
+@cached_json
+def get_statistics(snapshot):
     """Get statistics about the current port"""
-    if not port_worker:
+    if not snapshot:
         return jsonify({"error": "No port data available. Call /api/port first"}), 404
     
-    port_data = port_worker.data
-    
-    total_bollards = sum(berth.bollard_count for berth in port_data.berths)
-    total_hooks = sum(berth.hook_count for berth in port_data.berths)
-    
-    active_hooks = 0
-    faulted_hooks = 0
-    total_tension = 0
+    port_data = snapshot.data
     
+    # Berth level totals in a single pass; hook level totals come from the hook arrays
+    total_bollards = 0
+    total_hooks = 0
+    ships_docked = 0
     for berth in port_data.berths:
-        for bollard in berth.bollards:
-            for hook in bollard.hooks:
-                if hook.attached_line:
-                    active_hooks += 1
-                if hook.faulted:
-                    faulted_hooks += 1
-                if hook.tension is not None:
-                    total_tension += hook.tension
+        total_bollards += berth.bollard_count
+        total_hooks += berth.hook_count
+        if berth.ship:
+            ships_docked += 1
     
-    return jsonify({
+    hooks = snapshot.hook_arrays
+    active_hooks = int(np.count_nonzero(hooks["attached"]))
+    faulted_hooks = int(np.count_nonzero(hooks["faulted"]))
+    total_tension = int(hooks["tension"].sum())
+    
+    return {
         "port_name": port_data.name,
         "total_berths": len(port_data.berths),
         "total_bollards": total_bollards,
@@ -252,120 +434,99 @@ def get_statistics():
         "active_hooks": active_hooks,
         "faulted_hooks": faulted_hooks,
         "total_tension": total_tension,
-        "ships_docked": sum(1 for berth in port_data.berths if berth.ship)
-    })
+        "ships_docked": ships_docked
+    }
 
 
 @app.route('/api/port/analysis', methods=['GET'])
-def get_tension_analysis():
+@cached_json
+def get_tension_analysis(snapshot):
     """Get prioritized bollard analysis data"""
-    if not port_worker:
+    if not snapshot:
         return jsonify({"error": "No port data available. Generate port data first"}), 404
     
-    port_data = port_worker.data
+    port_data = snapshot.data
     all_bollards = []
     
+    # Count hooks per bollard over the whole port at once (tensions are whole numbers)
+    hooks = snapshot.hook_arrays
+    tension, bollard_ids, bollard_count = hooks["tension"], hooks["bollard"], hooks["bollard_count"]
+    counted = hooks["has_tension"] & ~hooks["faulted"]
+    critical_counts = np.bincount(bollard_ids[counted & (tension >= 86)], minlength=bollard_count).tolist()
+    dangerous_counts = np.bincount(
+        bollard_ids[counted & (tension >= 70) & (tension < 86)], minlength=bollard_count
+    ).tolist()
+    attention_counts = np.bincount(
+        bollard_ids[counted & (tension >= 40) & (tension < 70)], minlength=bollard_count
+    ).tolist()
+    faulted_counts = np.bincount(bollard_ids[hooks["faulted"]], minlength=bollard_count).tolist()
+    tension_totals = np.bincount(
+        bollard_ids, weights=tension, minlength=bollard_count
+    ).astype(np.int64).tolist()
+    
     # Collect all bollards from all berths with priority metrics
+    bollard_index = 0
     for berth in port_data.berths:
-        for bollard in berth.bollards:
-            # Collect hook data
-            hooks_data = [(hook, hook.tension if hook.tension is not None else None) for hook in bollard.hooks]
-            
-            critical_count = sum(1 for hook, tension in hooks_data if not hook.faulted and tension is not None and tension >= 86)
-            dangerous_count = sum(1 for hook, tension in hooks_data if not hook.faulted and tension is not None and 70 <= tension <= 85)
-            attention_count = sum(1 for hook, tension in hooks_data if not hook.faulted and tension is not None and 40 <= tension <= 69)
-            faulted_count = sum(1 for hook, tension in hooks_data if hook.faulted)
-            total_tension = sum(tension for hook, tension in hooks_data if tension is not None)
-            
+        # Reuse the hook dicts already built for the berth endpoints
+        for bollard, bollard_payload in zip(berth.bollards, snapshot.serialize_berth(berth)["bollards"]):
             bollard_info = {
                 "berth_name": berth.name,
                 "bollard_name": bollard.name,
                 "ship_name": berth.ship.name if berth.ship else "No Ship",
                 "vessel_id": berth.ship.vessel_id if berth.ship else "N/A",
-                "critical_count": critical_count,
-                "dangerous_count": dangerous_count,
-                "attention_count": attention_count,
-                "faulted_count": faulted_count,
-                "total_tension": total_tension,
-                "hooks": [
-                    {
-                        "name": hook.name,
-                        "tension": tension,
-                        "faulted": hook.faulted,
-                        "attached_line": hook.attached_line
-                    }
-                    for hook, tension in hooks_data
-                ]
+                "critical_count": critical_counts[bollard_index],
+                "dangerous_count": dangerous_counts[bollard_index],
+                "attention_count": attention_counts[bollard_index],
+                "faulted_count": faulted_counts[bollard_index],
+                "total_tension": tension_totals[bollard_index],
+                "hooks": bollard_payload["hooks"]
             }
             all_bollards.append(bollard_info)
+            bollard_index += 1
     
     # Sort by: 1. Critical hooks (desc), 2. Faulted hooks (desc), 3. Total tension (desc)
     all_bollards.sort(key=lambda x: (x["critical_count"], x["faulted_count"], x["total_tension"]), reverse=True)
     
-    return jsonify({
+    return {
         "port_name": port_data.name,
         "total_bollards": len(all_bollards),
         "bollards": all_bollards
-    })
+    }
 
 
 @app.route('/api/port/download', methods=['GET'])
-def download_port_data():
+@cached_json
+def download_port_data(snapshot):
     """Download current port data as JSON file"""
-    if not port_worker:
+    if not snapshot:
         return jsonify({"error": "No port data available. Generate port data first"}), 404
     
-    port_data = port_worker.data
+    port_data = snapshot.data
     
-    # Create a comprehensive JSON structure
-    data_export = {
-        "timestamp": datetime.now().isoformat(),
+    # Create a comprehensive JSON structure, stamped with the time the data last changed
+    header = {
+        "timestamp": snapshot.last_update_iso,
         "port_name": port_data.name,
-        "total_berths": len(port_data.berths),
-        "berths": []
+        "total_berths": len(port_data.berths)
     }
     
-    for berth in port_data.berths:
-        berth_data = {
-            "name": berth.name,
-            "bollard_count": berth.bollard_count,
-            "hook_count": berth.hook_count,
-            "ship": {
-                "name": berth.ship.name,
-                "vessel_id": berth.ship.vessel_id
-            } if berth.ship else None,
-            "radars": [
-                {
-                    "name": radar.name,
-                    "ship_distance": radar.ship_distance,
-                    "distance_change": radar.distance_change,
-                    "status": radar.distance_status
-                }
-                for radar in berth.radars
-            ],
-            "bollards": [
-                {
-                    "name": bollard.name,
-                    "hooks": [
-                        {
-                            "name": hook.name,
-                            "tension": hook.tension if hook.tension is not None else None,
-                            "faulted": hook.faulted,
-                            "attached_line": hook.attached_line
-                        }
-                        for hook in bollard.hooks
-                    ]
-                }
-                for bollard in berth.bollards
-            ]
-        }
-        data_export["berths"].append(berth_data)
+    def generate():
+        # Stream one berth at a time rather than serializing the whole port up front
+        yield orjson.dumps(header)[:-1] + b',"berths":['
+        for index, berth in enumerate(port_data.berths):
+            if index:
+                yield b','
+            yield orjson.dumps(snapshot.serialize_berth(berth))
+        yield b']}'
     
-    return jsonify(data_export)
+    return generate()
 
 
 if __name__ == '__main__':
     print("Starting Mooring Data Generator Flask API...")
     print("Visit http://localhost:5000 for the visual dashboard")
     print("Visit http://localhost:5000/api for API documentation")
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    import uvicorn
+    # A single worker process: the generated port lives in this process's memory
+    # Flask reads FLASK_DEBUG into app.debug; only then also auto-reload on changes
+    uvicorn.run("app:asgi_app", host='0.0.0.0', port=5000, reload=app.debug)
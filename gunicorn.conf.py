@@ -0,0 +1,13 @@
+"""Gunicorn settings for running the API in production: gunicorn app:app"""
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+
+# Each worker process generates and keeps its own port in memory, so more than one
+# worker only makes sense once port state is shared between processes
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+
+# Concurrent requests are handled by a thread pool inside the worker instead
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", multiprocessing.cpu_count() * 2 + 1))